@@ -1,9 +1,17 @@
 import streamlit as st
 import pandas as pd
-from difflib import SequenceMatcher, get_close_matches
-from PIL import Image
 import base64
-from io import BytesIO
+from msu_core import (
+    MATCH_CONFIDENCE,
+    all_questions,
+    answer_index,
+    best_csv_match_cached,
+    build_indices,
+    close_question_matches,
+    category_groups,
+    faq_content_hash,
+    load_faq,
+)
 # Streamlit rerun shim (works on old & new versions)
 try:
     rerun = st.rerun           # Streamlit ≥ 1.27-ish
@@ -16,47 +24,36 @@ except AttributeError:
 SUPPORT_EMAIL = "ask.ora@morgan.edu"
 CONTACT_NOTE = f"If you still need help, email <a href='mailto:{SUPPORT_EMAIL}'>{SUPPORT_EMAIL}</a>."
 
-# ---------- Helper: Convert Logo to Base64 ----------
-def get_image_base64(img):
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    return base64.b64encode(buffer.getvalue()).decode()
-
-# ---------- Helper: Show Answer with Logo ----------
-def show_answer_with_logo(answer_html):
-    st.markdown(
-        f"""
-        <div style='display:flex;align-items:flex-start;margin:10px 0;'>
-            <img src='data:image/png;base64,{logo_base64}' width='40' style='margin-right:10px;border-radius:8px;'/>
-            <div style='background:#f6f6f6;padding:12px;border-radius:12px;max-width:75%;'>
-                {answer_html}
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+# ---------- Helper: Load Logo as Base64 ----------
+@st.cache_resource
+def load_logo_b64(path):
+    """Read the PNG bytes once per process — the file is already PNG-encoded,
+    so there is no need to decode and re-encode it through PIL."""
+    try:
+        with open(path, "rb") as fh:
+            return base64.b64encode(fh.read()).decode()
+    except Exception:
+        return ""
 
 # ---------- Config & Logo ----------
 st.set_page_config(page_title="MSU Research Security Assistant", layout="centered")
 
-try:
-    # Place your MSU logo file beside this script as: logo.png
-    logo = Image.open("logo.png")
-    logo_base64 = get_image_base64(logo)
-except Exception:
-    logo_base64 = ""
-
-st.markdown(
-    f"""
+# Place your MSU logo file beside this script as: logo.png
+logo_base64 = load_logo_b64("logo.png")
+
+@st.cache_data(show_spinner=False)
+def static_header_html(logo_b64):
+    """Invariant hero markup, formatted once per logo rather than per rerun."""
+    return f"""
     <div style='text-align:left;'>
-        <img src='data:image/png;base64,{logo_base64}' width='150'/>
+        <img src='data:image/png;base64,{logo_b64}' width='150'/>
         <h2>MSU Research Security Assistant</h2>
         <h5><i> 🧠Smart Assistant for Research Integrity, Compliance & Security Support</i></h5>
         <p>🛡️ Trained on Morgan State University Research Security topics and federal guidance.</p>
     </div>
-    """,
-    unsafe_allow_html=True
-)
+    """
+
+st.markdown(static_header_html(logo_base64), unsafe_allow_html=True)
 
 # ---------- File Upload (optional, visual only) ----------
 uploaded_file = st.file_uploader("📎 Upload a file for reference (optional)", type=["pdf", "docx", "txt"])
@@ -66,153 +63,154 @@ if uploaded_file:
 # ---------- Load CSV ----------
 # Put a file named msu_faq.csv next to this script with columns: Category,Question,Answer
 try:
-    df = pd.read_csv("msu_faq.csv").fillna("")
+    faq_hash = faq_content_hash("msu_faq.csv")
+    df = load_faq("msu_faq.csv", faq_hash)
 except Exception as e:
     st.error("Could not read 'msu_faq.csv'. Make sure it exists and has columns: Category, Question, Answer.")
     df = pd.DataFrame(columns=["Category","Question","Answer"])
 
+if df.empty:
+    bm25_index, faq_categories = None, ()
+    answer_by_q = {}
+else:
+    bm25_index, faq_categories = build_indices("msu_faq.csv", faq_hash)
+    answer_by_q = answer_index("msu_faq.csv", faq_hash)
+
+# ---------- Button Callbacks ----------
+# on_click callbacks mutate session state before the rerun Streamlit already
+# schedules for the click, so no explicit st.rerun() is needed.
+def add_message(role, content):
+    st.session_state.roles.append(role)
+    st.session_state.contents.append(content)
+
+def answer_question(q):
+    add_message("user", q)
+    ans, _ = answer_by_q[q]
+    add_message("assistant", f"<b>Answer:</b> {ans}")
+
+def answer_suggested(q):
+    ans, _ = answer_by_q[q]
+    add_message("assistant", f"<b>Answer:</b> {ans}")
+    st.session_state.suggested_list = []
+
 # ---------- Session State ----------
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+if "roles" not in st.session_state:
+    st.session_state.roles = []
+    st.session_state.contents = []
 if "suggested_list" not in st.session_state:
     st.session_state.suggested_list = []
 if "last_category" not in st.session_state:
     st.session_state.last_category = ""
-if "clear_input" not in st.session_state:
-    st.session_state.clear_input = False
 
 # ---------- Category Selection ----------
-categories = ["All Categories"] + (sorted(df["Category"].unique()) if not df.empty else [])
+categories = ["All Categories"] + list(faq_categories)
 category = st.selectbox("📂 Select a category:", categories)
 
 # Reset session if category changes
 if st.session_state.last_category != category:
-    st.session_state.chat_history = []
+    st.session_state.roles = []
+    st.session_state.contents = []
     st.session_state.suggested_list = []
     st.session_state.last_category = category
     st.rerun()
 
-selected_df = df if (df.empty or category == "All Categories") else df[df["Category"] == category]
+if df.empty or category == "All Categories":
+    selected_df = df
+else:
+    selected_df = category_groups("msu_faq.csv", faq_hash).get(category.strip().lower(), df)
 
 # ---------- Chat Input ----------
-question = st.text_input("💬 Start typing your question...", value="" if st.session_state.clear_input else "")
-st.session_state.clear_input = False
+# st.chat_input reruns once per submitted question instead of per keystroke,
+# and clears itself, so no clear_input bookkeeping is needed.
+question = st.chat_input("💬 Ask a question about research security...") or ""
 
 # ---------- Show Example Questions as Buttons ----------
 if not question.strip() and not selected_df.empty:
     st.markdown("💬 Try asking one of these:")
     for i, q in enumerate(selected_df["Question"].head(3)):
-        if st.button(q, key=f"example_{i}"):
-            st.session_state.chat_history.append({"role": "user", "content": q})
-            ans = selected_df[selected_df["Question"] == q].iloc[0]["Answer"]
-            st.session_state.chat_history.append({"role": "assistant", "content": f"<b>Answer:</b> {ans}"})
-            st.session_state.clear_input = True
-            st.rerun()
+        st.button(q, key=f"example_{i}", on_click=answer_question, args=(q,))
 
 # ---------- Display Chat ----------
-st.markdown("<div style='margin-top:20px;'>", unsafe_allow_html=True)
-for msg in st.session_state.chat_history:
-    if msg["role"] == "user":
-        st.markdown(
-            f"""
-            <div style='text-align:right;margin:10px 0;'>
-                <div style='display:inline-block;background:#e6f7ff;padding:12px;border-radius:12px;max-width:70%;'>
-                    <b>You:</b> {msg['content']}
-                </div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-    else:
-        show_answer_with_logo(msg["content"])
-st.markdown("</div>", unsafe_allow_html=True)
-
-# ---------- Autocomplete Suggestions ----------
-if question.strip() and not selected_df.empty:
-    suggestions = [q for q in selected_df["Question"].tolist() if question.lower() in q.lower()][:5]
-    if suggestions:
-        st.markdown("<div style='margin-top:5px;'><b>Suggestions:</b></div>", unsafe_allow_html=True)
-        for s in suggestions:
-            if st.button(s, key=f"suggest_{s}"):
-                st.session_state.chat_history.append({"role": "user", "content": s})
-                ans = selected_df[selected_df["Question"] == s].iloc[0]["Answer"]
-                st.session_state.chat_history.append({"role": "assistant", "content": f"<b>Answer:</b> {ans}"})
-                st.session_state.clear_input = True
-                st.rerun()
+ASSISTANT_AVATAR = f"data:image/png;base64,{logo_base64}" if logo_base64 else None
+with st.container():
+    for role, content in zip(st.session_state.roles, st.session_state.contents):
+        with st.chat_message(role, avatar=ASSISTANT_AVATAR if role == "assistant" else None):
+            st.markdown(content, unsafe_allow_html=True)
 
 # ---------- Submit Question ----------
-if st.button("Submit") and question.strip():
-    st.session_state.chat_history.append({"role": "user", "content": question})
+if question.strip():
+    add_message("user", question)
 
     previous_suggestions = st.session_state.suggested_list
     st.session_state.suggested_list = []
-    st.session_state.clear_input = True  # Clear input after submit
 
     # Check for exact or close match
-    all_questions = selected_df["Question"].tolist() if not selected_df.empty else []
-    best_match = None
-    best_score = 0
-    for q in all_questions:
-        score = SequenceMatcher(None, question.lower(), q.lower()).ratio()
-        if score > best_score:
-            best_match = q
-            best_score = score
-
-    if best_match and best_score >= 0.85:  # Only answer if confidence is high
-        row = selected_df[selected_df["Question"] == best_match].iloc[0]
-        ans = row["Answer"]
-        category_note = row["Category"]
+    category_questions = tuple(selected_df["Question"]) if not selected_df.empty else ()
+    best_match, best_score = best_csv_match_cached(question.strip().lower(), category_questions)
+
+    if best_match and best_score >= MATCH_CONFIDENCE:  # Only answer if confidence is high
+        ans, category_note = answer_by_q[best_match]
         response_text = f"<b>Answer:</b> {ans}<br><i>(Note: This question belongs to the '{category_note}' category.)</i>"
-        st.session_state.chat_history.append({"role": "assistant", "content": response_text})
+        add_message("assistant", response_text)
     else:
         if previous_suggestions:
             # User ignored suggestions previously → show best prior global match
             match_q = previous_suggestions[0]
-            row = df[df["Question"] == match_q].iloc[0]
-            ans = row["Answer"]
-            category_note = row["Category"]
+            ans, category_note = answer_by_q[match_q]
             response_text = f"<b>Answer:</b> {ans}<br><i>(Note: This question belongs to the '{category_note}' category.)</i>"
-            st.session_state.chat_history.append({"role": "assistant", "content": response_text})
+            add_message("assistant", response_text)
         else:
             # Suggest top 3 questions instead of giving a wrong answer
-            all_q_global = df["Question"].tolist() if not df.empty else []
-            top_matches = get_close_matches(question, all_q_global, n=3, cutoff=0.4)
+            all_q_global = all_questions("msu_faq.csv", faq_hash) if not df.empty else ()
+            top_matches = []
+            if bm25_index is not None:
+                top_matches = [df["Question"].iloc[doc_id] for doc_id, _ in bm25_index.top_k(question, k=3)]
+            if not top_matches:
+                top_matches = close_question_matches(question, all_q_global, n=3)
             if top_matches:
-                guessed_category = df[df["Question"] == top_matches[0]].iloc[0]["Category"]
+                _, guessed_category = answer_by_q[top_matches[0]]
                 response_text = (f"I couldn't find an exact match, but your question seems related to <b>{guessed_category}</b>.<br><br>" 
                  "Here are some similar questions:<br>"
                  + "".join(f"{i}. {q}<br>" for i, q in enumerate(top_matches, start=1))
                  + "<br>Select one below to see its answer.<br><br>"
                  + CONTACT_NOTE
                )
-                st.session_state.chat_history.append({"role": "assistant", "content": response_text})
+                add_message("assistant", response_text)
                 st.session_state.suggested_list = top_matches
             else:
-                st.session_state.chat_history.append({     "role": "assistant",     "content": "I couldn't find a close match. Please try rephrasing.<br><br>" + CONTACT_NOTE })
+                add_message("assistant", "I couldn't find a close match. Please try rephrasing.<br><br>" + CONTACT_NOTE)
 
     st.rerun()
 
-# ---------- Show Buttons for Top Suggestions ----------
+# ---------- Top Suggestions ----------
+def pick_suggestion():
+    choice = st.session_state.get("suggestion_choice")
+    if choice:
+        answer_suggested(choice)
+
+# One radio widget instead of a button per suggestion: a single widget
+# registration and DOM node to diff on each rerun.
 if st.session_state.suggested_list:
-    st.markdown("<div style='margin-top:15px;'><b>Choose a question:</b></div>", unsafe_allow_html=True)
-    for i, q in enumerate(st.session_state.suggested_list):
-        if st.button(q, key=f"choice_{i}"):
-            row = df[df["Question"] == q].iloc[0]
-            ans = row["Answer"]
-            st.session_state.chat_history.append({"role": "assistant", "content": f"<b>Answer:</b> {ans}"})
-            st.session_state.suggested_list = []
-            st.session_state.clear_input = True
-            st.rerun()
+    st.radio(
+        "Choose a question:",
+        options=st.session_state.suggested_list,
+        index=None,
+        key="suggestion_choice",
+        on_change=pick_suggestion,
+    )
 
 # ---------- Download Chat History ----------
-if st.session_state.chat_history:
-    chat_text = ""
-    for msg in st.session_state.chat_history:
-        role = "You" if msg["role"] == "user" else "Assistant"
-        chat_text += f"{role}: {msg['content']}\n\n"
-    b64 = base64.b64encode(chat_text.encode()).decode()
-    href = f'<a href="data:file/txt;base64,{b64}" download="chat_history.txt">📥 Download Chat History</a>'
-    st.markdown(href, unsafe_allow_html=True)
+if st.session_state.roles:
+    chat_text = "\n\n".join(
+        f"{'You' if role == 'user' else 'Assistant'}: {content}"
+        for role, content in zip(st.session_state.roles, st.session_state.contents)
+    )
+    st.download_button(
+        "📥 Download Chat History",
+        data=chat_text.encode(),
+        file_name="chat_history.txt",
+        mime="text/plain",
+    )
 
 st.caption("⚖️Disclaimer: This is a demo tool. For official guidance, refer to MSU policies. 💻 It offers AI-powered answers based on MSU-specific rules, NSPM-33, and quick links to forms and training. 📚 Designed to support under-resourced teams by streamlining award workflows and boosting compliance, without accessing sensitive data.⚖️")
 
@@ -0,0 +1,233 @@
+"""Shared matching and indexing core for the MSU Research Security Assistant.
+
+UI entrypoints import from here so the compiled regexes, BM25 index, and
+st.cache_* resources are defined once and shared across scripts.
+"""
+import streamlit as st
+import pandas as pd
+from difflib import SequenceMatcher, get_close_matches
+import hashlib
+import heapq
+import math
+import re
+from collections import defaultdict
+try:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+except ImportError:
+    TfidfVectorizer = None
+# RapidFuzz is a C++ drop-in for difflib's ratio/get_close_matches
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = None
+    process = None
+# Optional semantic matching (heavier install; see requirements.txt)
+try:
+    import faiss
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    faiss = None
+    SentenceTransformer = None
+
+_TOK_RE = re.compile(r"\w+")
+
+# ---------- Question Matching ----------
+SEMANTIC_OK = faiss is not None and SentenceTransformer is not None
+EMBED_MODEL = "all-MiniLM-L6-v2"
+# Cosine similarity (semantic or TF-IDF) scores well below SequenceMatcher's
+# scale, so each path carries its own confidence cutoff.
+MATCH_CONFIDENCE = 0.60 if (SEMANTIC_OK or TfidfVectorizer is not None) else 0.85
+
+@st.cache_resource
+def lowered_questions(questions):
+    """Strip and lowercase the question set once per category selection,
+    not per query."""
+    return tuple(q.strip().lower() for q in questions)
+
+@st.cache_resource
+def build_tfidf(questions):
+    vectorizer = TfidfVectorizer(lowercase=True, ngram_range=(1, 2))
+    matrix = vectorizer.fit_transform(questions)
+    return vectorizer, matrix
+
+@st.cache_resource
+def embed_model():
+    """Load the sentence-transformer once per process; the per-question-set
+    indexes all share this single copy."""
+    return SentenceTransformer(EMBED_MODEL)
+
+@st.cache_resource
+def build_semantic_index(questions):
+    """Embed the FAQ questions once and index them for cosine search."""
+    model = embed_model()
+    embeddings = model.encode(
+        list(questions), normalize_embeddings=True, batch_size=64, convert_to_numpy=True
+    ).astype("float32")
+    dim = embeddings.shape[1]
+    n_vectors = len(embeddings)
+    if n_vectors > 100_000:
+        # Full-precision vectors cost ~1.5 KB each; product quantization cuts
+        # that to ~48 B and IVF prunes the search space.
+        nlist = min(4 * int(math.sqrt(n_vectors)), 4096)
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, 48, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+        index.nprobe = 16
+    elif n_vectors > 10_000:
+        # Exact search is O(N) per query; beyond ~10k entries switch to HNSW
+        # for approximate search at recall > 0.95.
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+        index.hnsw.efSearch = 64
+    else:
+        index = faiss.IndexFlatIP(dim)
+    index.add(embeddings)
+    return index
+
+def best_csv_match(question, questions):
+    """Return (best_question, score) for the closest FAQ question, or (None, 0)."""
+    if not questions:
+        return None, 0.0
+    q_norm = question.strip().lower()
+    if SEMANTIC_OK:
+        index = build_semantic_index(questions)
+        query = embed_model().encode([question], normalize_embeddings=True, convert_to_numpy=True).astype("float32")
+        scores, ids = index.search(query, 1)
+        return questions[int(ids[0][0])], float(scores[0][0])
+    if TfidfVectorizer is not None:
+        vectorizer, matrix = build_tfidf(questions)
+        sims = (matrix @ vectorizer.transform([question]).T).toarray().ravel()
+        best_idx = int(sims.argmax())
+        return questions[best_idx], float(sims[best_idx])
+    if process is not None:
+        # cdist scores the whole candidate list in one C call and releases
+        # the GIL across worker threads.
+        sims = process.cdist([q_norm], lowered_questions(questions), scorer=fuzz.ratio, workers=-1)[0]
+        best_idx = int(sims.argmax())
+        return questions[best_idx], float(sims[best_idx]) / 100.0
+    # SequenceMatcher fallback: prefilter with cheap substring checks so the
+    # expensive ratio() only runs on candidates sharing a query token.
+    q_tokens = set(_TOK_RE.findall(q_norm))
+    lowered = lowered_questions(questions)
+    survivors = [i for i, cand in enumerate(lowered) if any(tok in cand for tok in q_tokens)]
+    if not survivors:
+        survivors = list(range(len(questions)))
+    # One matcher per query: set_seq2 builds the b2j table once, and autojunk
+    # is disabled because repetitive compliance boilerplate triggers its
+    # popular-element heuristic and skews ratios.
+    sm = SequenceMatcher(autojunk=False)
+    sm.set_seq2(q_norm)
+    q_len = len(q_norm)
+    # Visit closest-length candidates first so best_score tightens early and
+    # the bounds below prune more of the tail.
+    survivors.sort(key=lambda i: abs(len(lowered[i]) - q_len))
+    best_match = None
+    best_score = 0.0
+    for i in survivors:
+        cand_len = len(lowered[i])
+        # ratio() can never exceed 2*min/(len_a+len_b); skip candidates whose
+        # lengths already bound them out, then apply difflib's cheaper bounds
+        # before the full O(n*m) ratio.
+        if 2 * min(q_len, cand_len) <= best_score * (q_len + cand_len):
+            continue
+        sm.set_seq1(lowered[i])
+        if sm.real_quick_ratio() <= best_score or sm.quick_ratio() <= best_score:
+            continue
+        score = sm.ratio()
+        if score > best_score:
+            best_match = questions[i]
+            best_score = score
+    return best_match, best_score
+
+@st.cache_data(max_entries=512, ttl=3600, show_spinner=False)
+def best_csv_match_cached(question, questions):
+    """Memoized best_csv_match: repeat questions (retyped or re-clicked)
+    within the same question set return without rescoring."""
+    return best_csv_match(question, questions)
+
+def close_question_matches(question, candidates, n=3):
+    """Top-n fuzzy question matches (RapidFuzz when installed, difflib otherwise)."""
+    if process is not None:
+        # token_set_ratio ignores word order and duplicate tokens, which suits
+        # free-form FAQ queries better than sequence-based ratios
+        return [m for m, s, _ in process.extract(question, candidates, scorer=fuzz.token_set_ratio, limit=n, score_cutoff=40)]
+    return get_close_matches(question, candidates, n=n, cutoff=0.4)
+
+# ---------- BM25 Index over FAQ Text ----------
+class BM25Index:
+    """Inverted index with BM25 scoring, built once over the FAQ rows.
+
+    Indexes question + answer text together so queries phrased in answer
+    vocabulary still surface the right FAQ entry. Each query costs only the
+    postings of its own terms instead of a scan over every row.
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, texts):
+        self.postings = defaultdict(list)  # term -> [(doc_id, tf), ...]
+        self.doc_len = []
+        for doc_id, text in enumerate(texts):
+            tokens = _TOK_RE.findall(text.lower())
+            self.doc_len.append(len(tokens))
+            tf = defaultdict(int)
+            for tok in tokens:
+                tf[tok] += 1
+            for tok, count in tf.items():
+                self.postings[tok].append((doc_id, count))
+        n_docs = len(self.doc_len)
+        self.avgdl = (sum(self.doc_len) / n_docs) if n_docs else 0.0
+        self.idf = {
+            term: math.log((n_docs - len(plist) + 0.5) / (len(plist) + 0.5) + 1)
+            for term, plist in self.postings.items()
+        }
+
+    def top_k(self, query, k=3):
+        """Return up to k (doc_id, score) pairs, best first."""
+        scores = defaultdict(float)
+        for term in _TOK_RE.findall(query.lower()):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.K1 * (1 - self.B + self.B * self.doc_len[doc_id] / self.avgdl)
+                scores[doc_id] += idf * tf * (self.K1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+# ---------- FAQ Loading ----------
+def faq_content_hash(path):
+    """Hash the CSV bytes so caches invalidate when the file changes on disk."""
+    with open(path, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+@st.cache_data(show_spinner=False)
+def load_faq(path, content_hash):
+    return pd.read_csv(path).fillna("")
+
+@st.cache_resource
+def all_questions(path, content_hash):
+    """The full question list as a tuple, cached for the fallback matchers."""
+    return tuple(load_faq(path, content_hash)["Question"])
+
+@st.cache_resource
+def answer_index(path, content_hash):
+    """Map each question to its (answer, category) for O(1) lookups."""
+    faq = load_faq(path, content_hash)
+    return {q: (a, c) for q, a, c in zip(faq["Question"], faq["Answer"], faq["Category"])}
+
+@st.cache_resource
+def category_groups(path, content_hash):
+    """Pre-split the FAQ by normalized category so selection is a dict hit."""
+    faq = load_faq(path, content_hash)
+    keys = faq["Category"].str.strip().str.lower()
+    return {k: v.reset_index(drop=True) for k, v in faq.groupby(keys, sort=False)}
+
+@st.cache_resource
+def build_indices(path, content_hash):
+    """Build the BM25 index and category list once per CSV content hash."""
+    faq = load_faq(path, content_hash)
+    bm25 = BM25Index(q + " " + a for q, a in zip(faq["Question"], faq["Answer"]))
+    categories = tuple(sorted(faq["Category"].unique()))
+    return bm25, categories